@@ -1,27 +1,47 @@
 import asyncio
+import functools
+from asyncio.futures import _PENDING, _FINISHED
 
-FIRST_COMPLETED = 'FIRST_COMPLETED'
-ALL_COMPLETED = 'ALL_COMPLETED'
+FIRST_COMPLETED = asyncio.FIRST_COMPLETED
+ALL_COMPLETED = asyncio.ALL_COMPLETED
+
+# Per iterator states, as stored in `AsyncZip._states`.
+_PENDING_STATE = 0
+_DONE_STATE = 1
+_STOPPED_STATE = 2
+
+
+def _is_stop(future):
+    """Tell if the given `__anext__()` future raised StopAsyncIteration,
+    peeking at the future state like asyncio does internally.
+    """
+    return (future._state == _FINISHED and
+            type(future._exception) is StopAsyncIteration)
 
 
 class AsyncZip:
     """Aggregates asynchronous iterables, like `zip` or `select`.
 
     The current state is stored in `self.iterating` as the `__anext__()`
-    coroutine.
+    coroutine, and mirrored in the `self._states` bytearray as
+    `_PENDING_STATE`, `_DONE_STATE` or `_STOPPED_STATE`. The done
+    callbacks keep it up to date, and `_collect` catches up with futures
+    done whose callback did not run yet.
 
     When a `__anext__()` is done, we're immediatly replacing it with:
-    self.iterating[i] = asyncio.ensure_future(
-        self.asynchronous_iterators[i].__anext__(),
-        loop=self._loop)
+    self._schedule(i)
 
     There is no option to ask `AsyncZip` to stop iterating to the
     shortest iterable, just break yourself when you see an iterable is
     exhausted (having `done()` to `True` and `exception()` to
     `StopAsyncIteration`).
     """
-    def __init__(self, *asynchronous_iterables, loop=None,
-                 yield_when=FIRST_COMPLETED):
+    __slots__ = ('yield_when', 'asynchronous_iterables',
+                 'asynchronous_iterators', 'iterating', '_states',
+                 '_n_done', '_n_stopped', '_waiter', '_first_completed',
+                 '_exhausted')
+
+    def __init__(self, *asynchronous_iterables, yield_when=FIRST_COMPLETED):
         """yield_when can take two values:
 
         - ALL_COMPLETED: Like `zip`, to get values from each iterables
@@ -29,83 +49,136 @@ class AsyncZip:
         - FIRST_COMPLETED: Like `select`, to get values as soon as
           possible, so basically one value per iteration (the
           others in a pending state).
+
+        Any other value raises a ValueError, like for `asyncio.wait`.
         """
+        if yield_when not in (FIRST_COMPLETED, ALL_COMPLETED):
+            raise ValueError(
+                'Invalid yield_when value: {}'.format(yield_when))
         self.yield_when = yield_when
-        if loop is not None:
-            self._loop = loop
-        else:
-            self._loop = asyncio.events.get_event_loop()
+        self._first_completed = yield_when == FIRST_COMPLETED
         self.asynchronous_iterables = asynchronous_iterables
         self.asynchronous_iterators = []
         self.iterating = []
+        self._states = bytearray()
+        self._n_done = 0
+        self._n_stopped = 0
+        self._waiter = None
+        self._exhausted = False
 
     async def __aiter__(self):
-        self.asynchronous_iterators = []
-        for iterable in self.asynchronous_iterables:
-            self.asynchronous_iterators.append(await iterable.__aiter__())
-        self.iterating = [asyncio.ensure_future(iterator.__anext__(),
-                                                loop=self._loop)
-                          for iterator in self.asynchronous_iterators]
+        self.asynchronous_iterators = list(await asyncio.gather(
+            *[iterable.__aiter__()
+              for iterable in self.asynchronous_iterables]))
+        self.iterating = [None] * len(self.asynchronous_iterators)
+        self._states = bytearray(len(self.asynchronous_iterators))
+        self._n_done = 0
+        self._n_stopped = 0
+        self._exhausted = False
+        for i in range(len(self.asynchronous_iterators)):
+            self._schedule(i)
         return self
 
-    def should_wait(self):
-        if all(f.done() and isinstance(f.exception(), StopAsyncIteration) for
-               f in self.iterating):
-            return False
-        if self.yield_when == FIRST_COMPLETED:
-            return not any(f.done() and
-                           not isinstance(f.exception(), StopAsyncIteration) for
-                           f in self.iterating)
-        if self.yield_when == ALL_COMPLETED:
-            return not all(f.done() and
-                           not isinstance(f.exception(), StopAsyncIteration) for
-                           f in self.iterating)
+    def _schedule(self, i):
+        """Schedule the next `__anext__()` of the i-th iterator, updating
+        its state and waking up `_waiter` once done. The callback is
+        never removed: it's harmless to fire while nobody is waiting.
+        """
+        future = asyncio.ensure_future(
+            self.asynchronous_iterators[i].__anext__())
+        future.add_done_callback(functools.partial(self._on_completion, i))
+        self.iterating[i] = future
+        self._states[i] = _PENDING_STATE
+
+    def _on_completion(self, i, future):
+        stopped = _is_stop(future)
+        if stopped:
+            # Exhaustion is expected, mark it as retrieved so asyncio
+            # does not log it.
+            future.exception()
+        if self.iterating[i] is not future:
+            # Left over by an iteration interrupted before consuming
+            # it, `__aiter__` already scheduled a new one for this slot.
+            return
+        if self._states[i] != _PENDING_STATE:
+            # Already accounted for by `_collect`.
+            return
+        if stopped:
+            self._states[i] = _STOPPED_STATE
+            self._n_stopped += 1
+        else:
+            self._states[i] = _DONE_STATE
+            self._n_done += 1
+        waiter = self._waiter
+        if waiter is None or waiter.done():
+            return
+        # In ALL_COMPLETED mode, only wake up `__anext__` once nothing
+        # is left pending.
+        if (self._first_completed or
+                self._n_done + self._n_stopped == len(self._states)):
+            waiter.set_result(None)
+
+    def _collect(self):
+        """Account for futures already done whose done callback did not
+        run yet, so `_states` agrees with what `self.iterating` shows.
+        Their callback becomes a no-op once it runs.
+        """
+        states = self._states
+        iterating = self.iterating
+        i = states.find(_PENDING_STATE)
+        while i != -1:
+            future = iterating[i]
+            if future._state != _PENDING:
+                self._on_completion(i, future)
+            i = states.find(_PENDING_STATE, i + 1)
+
+    def _should_wait(self, stopped):
+        """Tell if `__anext__` has to wait before yielding, given the
+        number of iterators that were exhausted when it started.
+        """
+        if self._first_completed:
+            # An iterator exhausted while we were waiting still counts
+            # as a completion, like the others.
+            return (self._n_done == 0 and self._n_stopped == stopped and
+                    stopped != len(self._states))
+        return self._n_done + self._n_stopped < len(self._states)
 
     async def __anext__(self):
-        waiter = asyncio.futures.Future(loop=self._loop)
-        counter = 0
-        def _on_completion(f):
-            nonlocal counter
-            counter -= 1
-            if self.yield_when == FIRST_COMPLETED or counter <= 0:
-                if not waiter.done():
-                    waiter.set_result(None)
-
-        listenning_for = set()
-        for i, f in enumerate(self.iterating):
-            # Skip already empty iterators
-            if f.done() and isinstance(f.exception(), StopAsyncIteration):
-                continue
-            counter += 1
-            listenning_for.add(i)
-            f.add_done_callback(_on_completion)
-
-        if self.should_wait():
-            await waiter
-
-        results = []
-        stop_async_iterations = 0
-        for i, f in enumerate(self.iterating):
-            results.append(f)
-            if i not in listenning_for:
-                stop_async_iterations += 1
-                continue
-            f.remove_done_callback(_on_completion)
-            if f.done() and isinstance(f.exception(), StopAsyncIteration):
-                stop_async_iterations += 1
-            elif f.done():
-                self.iterating[i] = asyncio.ensure_future(
-                    self.asynchronous_iterators[i].__anext__(),
-                    loop=self._loop)
-        if stop_async_iterations == len(self.iterating):
+        if self._exhausted:
+            raise StopAsyncIteration
+        self._collect()
+        stopped = self._n_stopped
+        should_wait = self._should_wait
+        while should_wait(stopped):
+            self._waiter = asyncio.get_event_loop().create_future()
+            try:
+                await self._waiter
+            finally:
+                self._waiter = None
+            # Futures done in the same loop iteration as the one waking
+            # us up are in `results`, they have to be rescheduled too.
+            self._collect()
+
+        results = self.iterating[:]
+        if self._n_done:
+            states = self._states
+            i = states.find(_DONE_STATE)
+            while i != -1:
+                self._schedule(i)
+                i = states.find(_DONE_STATE, i + 1)
+            self._n_done = 0
+        if self._n_stopped == len(self._states):
+            self._exhausted = True
             raise StopAsyncIteration
         return results
 
 
 if __name__ == '__main__':
+    import collections
+
     class DummyAsyncIterable:
         def __init__(self, items, latency=0):
-            self.items = items
+            self.items = collections.deque(items)
             self.latency = latency
 
         async def __aiter__(self):
@@ -115,11 +188,25 @@ if __name__ == '__main__':
             try:
                 if self.latency != 0:
                     await asyncio.sleep(self.latency)
-                return self.items.pop(0)
+                return self.items.popleft()
             except IndexError:
                 raise StopAsyncIteration
 
 
+    class GatedAsyncIterable(DummyAsyncIterable):
+        """Yields its next item only once its gate is opened."""
+        def __init__(self, items):
+            super().__init__(items)
+            self.gate = asyncio.Event()
+
+        async def __anext__(self):
+            if not self.items:
+                raise StopAsyncIteration
+            await self.gate.wait()
+            self.gate.clear()
+            return self.items.popleft()
+
+
     def _repr_task(task):
         """Just give:
          - . if it's a StopAsyncIteration,
@@ -153,6 +240,72 @@ if __name__ == '__main__':
         assert(', '.join(got) == expect)
 
 
+    async def test_AsyncZip_reiterate(listA, listB, lag, yield_when,
+                                      expect):
+        """Break out of a first iteration after one yield, then iterate
+        again over the same `AsyncZip`.
+        """
+        zipped = AsyncZip(DummyAsyncIterable(list(listA[0]), listA[1]),
+                          DummyAsyncIterable(list(listB[0]), listB[1]),
+                          yield_when=yield_when)
+        async for items in zipped:
+            break
+        got = []
+        async for items in zipped:
+            got.append(''.join(_repr_task(task) for task in items))
+            await asyncio.sleep(lag)
+        print(', '.join(got))
+        assert(', '.join(got) == expect)
+
+
+    async def test_AsyncZip_exhausted(listA, listB, more, yield_when,
+                                      expect):
+        """Exhaust an `AsyncZip`, check it stays exhausted, then give
+        more items to its iterables and iterate over it again.
+        """
+        iterableA = DummyAsyncIterable(list(listA))
+        iterableB = DummyAsyncIterable(list(listB))
+        zipped = AsyncZip(iterableA, iterableB, yield_when=yield_when)
+        got = []
+        async for items in zipped:
+            got.append(''.join(_repr_task(task) for task in items))
+        for _ in range(3):
+            try:
+                await zipped.__anext__()
+            except StopAsyncIteration:
+                pass
+            else:
+                raise AssertionError("Exhausted AsyncZip yielded.")
+        iterableA.items.extend(more[0])
+        iterableB.items.extend(more[1])
+        async for items in zipped:
+            got.append(''.join(_repr_task(task) for task in items))
+        print(', '.join(got))
+        assert(', '.join(got) == expect)
+
+
+    async def test_AsyncZip_same_tick(yield_when, expect):
+        """Open B's gate one loop iteration after A's, so B completes
+        while the consumer is being woken up by A: B must still be
+        yielded once only.
+        """
+        iterableA = GatedAsyncIterable('a')
+        iterableB = GatedAsyncIterable('b')
+        loop = asyncio.get_event_loop()
+
+        def open_gates():
+            iterableA.gate.set()
+            loop.call_soon(iterableB.gate.set)
+
+        loop.call_later(.01, open_gates)
+        got = []
+        async for items in AsyncZip(iterableA, iterableB,
+                                    yield_when=yield_when):
+            got.append(''.join(_repr_task(task) for task in items))
+        print(', '.join(got))
+        assert(', '.join(got) == expect)
+
+
     asyncio.get_event_loop().run_until_complete(test_AsyncZip(
         ('123', 0), ('abcd', .1), ('ABCD', .25), .01, FIRST_COMPLETED,
         '1~~, 2~~, 3~~, .a~, .b~, .~A, .c~, .d~, .~B, ..C, ..D'))
@@ -180,3 +333,20 @@ if __name__ == '__main__':
     asyncio.get_event_loop().run_until_complete(test_AsyncZip(
         ('12', 0), ('abcd', .1), ('ABCDE', .25), .21, ALL_COMPLETED,
         '1aA, 2bB, .cC, .dD, ..E'))
+
+    asyncio.get_event_loop().run_until_complete(test_AsyncZip_reiterate(
+        ('123456', .01), ('abcdef', .1), .01, FIRST_COMPLETED,
+        '3~, 4~, 5~, 6~, .~, .b, .c, .d, .e, .f'))
+
+    asyncio.get_event_loop().run_until_complete(test_AsyncZip_reiterate(
+        ('123456', .01), ('abcdef', .1), .01, ALL_COMPLETED,
+        '3c, 4d, 5e, 6f'))
+
+    asyncio.get_event_loop().run_until_complete(test_AsyncZip_exhausted(
+        '12', 'abc', ('x', 'yz'), ALL_COMPLETED, '1a, 2b, .c, xy, .z'))
+
+    asyncio.get_event_loop().run_until_complete(test_AsyncZip_same_tick(
+        FIRST_COMPLETED, 'ab'))
+
+    asyncio.get_event_loop().run_until_complete(test_AsyncZip_same_tick(
+        ALL_COMPLETED, 'ab'))
@@ -2,10 +2,13 @@
 
 from distutils.core import setup
 
+with open('README.rst', 'rt') as readme:
+    long_description = readme.read()
+
 setup(name='asynczip',
       version='1.0.7',
       description='Asynchronous `zip` like aggregator for `async for`',
-      long_description=open('README.rst', 'rt').read(),
+      long_description=long_description,
       author='Julien Palard',
       author_email='julien@palard.fr',
       keywords=['asyncio', 'zip', 'select', 'async for', 'async'],